@@ -0,0 +1,48 @@
+# Copyright 2013-2023 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Data structures that represent Slick's dependency relationships."""
+import functools
+from typing import Tuple
+
+#: The types of dependency relationships that Slick understands.
+all_deptypes = ("build", "link", "run", "test")
+
+#: Default dependency type if none is specified
+default_deptype = ("build", "link")
+
+
+def canonical_deptype(deptype) -> Tuple[str, ...]:
+    """Convert deptype to a canonical sorted tuple, or raise ValueError.
+
+    Args:
+        deptype (str or list or tuple): string representing dependency
+            type, or a list/tuple of such strings.  Can also be the
+            builtin function ``all`` or the string 'all', which result in
+            a tuple of all dependency types known to Slick.
+    """
+    if isinstance(deptype, (list, set, frozenset)):
+        deptype = tuple(deptype) # hashable, for the cache below
+    return _canonical_deptype(deptype)
+
+
+# Only a handful of distinct deptype arguments ever occur.
+@functools.lru_cache(maxsize=64)
+def _canonical_deptype(deptype) -> Tuple[str, ...]:
+    if deptype in (None, "all", all):
+        return all_deptypes
+
+    elif isinstance(deptype, str):
+        if deptype not in all_deptypes:
+            raise ValueError("Invalid dependency type: %s" % deptype)
+        return (deptype,)
+
+    elif isinstance(deptype, tuple):
+        bad = [d for d in deptype if d not in all_deptypes]
+        if bad:
+            raise ValueError("Invalid dependency types: %s" % ",".join(str(t) for t in bad))
+        return tuple(sorted(set(deptype)))
+
+    raise ValueError("Invalid dependency type: %s" % repr(deptype))
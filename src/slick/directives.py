@@ -37,12 +37,11 @@ from typing import List, Set, Union, Optional
 from .variant import Variant
 from .spec import Spec, parse_spec, identifier_re
 from .util.lang import dedupe
+from .dependency import canonical_deptype, default_deptype
 
 def colorize(s):
     return s
 
-default_deptype = ("build", "link")
-
 #: These are variant names used by Spack internally; packages can't use them
 reserved_names = ["patches", "dev_path"]
 
@@ -170,7 +169,6 @@ class DirectiveMeta(type):
         # The instance is being initialized: if it is a package we must ensure
         # that the directives are called to set it up.
 
-        print(cls.__module__)
         if True:
             # Ensure the presence of the dictionaries associated
             # with the directives
@@ -821,5 +819,24 @@ class PackageMeta(DirectiveMeta):
     """
 
     def __new__(cls, name, bases, attr_dict):
+        # Per-class caches, so that subclasses never see their parent's values
         attr_dict["_name"] = None
+        attr_dict["_version_urls"] = None
+        attr_dict["_version_url_index"] = None
+        attr_dict["_provided_by_name"] = None
         return super(PackageMeta, cls).__new__(cls, name, bases, attr_dict)
+
+    def __init__(cls, name, bases, attr_dict):
+        super(PackageMeta, cls).__init__(name, bases, attr_dict)
+
+        # The MRO never changes after class creation, so the fullnames
+        # of this package and the ones it inherits from are fixed here.
+        fullnames = []
+        for base in cls.__mro__:
+            namespace = getattr(base, "namespace", None)
+            if namespace:
+                fullnames.append("%s.%s" % (namespace, base.name))
+            if namespace == "builtin":
+                # builtin packages cannot inherit from other repos
+                break
+        cls._fullnames = tuple(fullnames)
@@ -1,6 +1,10 @@
-import argparse
+import atexit
+import contextlib
+import io
 import logging
+import os
 import sys
+import time
 
 from slick import __version__
 
@@ -10,7 +14,11 @@ __license__ = "MIT"
 
 _logger = logging.getLogger(__name__)
 
-from .repo import load_package
+#: buffering handler installed by setup_logging
+_log_handler = None
+
+#: level last applied by setup_logging, None until it has run
+_configured_level = None
 
 def slick(pkg):
     """Print info. about a package.
@@ -21,14 +29,46 @@ def slick(pkg):
     Returns:
       info (string): package metadata description
     """
-    pkg = load_package(pkg)
+    # deferred so that usage errors don't pay for loading the repo machinery
+    from .repo import load_package
 
-    info = '\n'.join(map(repr,
-       [pkg, pkg.name,
-       pkg.variants,
-       pkg.fullnames]
-    ))
-    return info
+    pkg = load_package(pkg)
+    variants = tuple(pkg.variants.items())
+
+    # repr of each object seen while formatting, keyed by id(),
+    # so objects repeated across entries are only formatted once.
+    # Everything stays referenced by pkg, so ids can't be reused.
+    seen = {}
+    def _repr(x):
+        k = id(x)
+        r = seen.get(k)
+        if r is None:
+            r = repr(x)
+            seen[k] = r
+        return r
+
+    buf = io.StringIO()
+    write = buf.write
+    write(repr(pkg))
+    write('\n')
+    write(repr(pkg.name))
+    write('\n')
+    # the same text as repr(pkg.variants), a dict of
+    # name: (Variant, [when specs])
+    write('{')
+    sep = ''
+    for name, (variant, when_specs) in variants:
+        write(sep)
+        sep = ', '
+        write(repr(name))
+        write(': (')
+        write(_repr(variant))
+        write(', [')
+        write(', '.join([_repr(w) for w in when_specs]))
+        write('])')
+    write('}\n')
+    write(repr(list(pkg.fullnames))) # a tuple now, but shown as a list
+    return buf.getvalue()
 
 # ---- CLI ----
 # The functions defined in this section are wrappers around the main Python
@@ -36,30 +76,168 @@ def slick(pkg):
 # executable/script.
 
 
-def setup_logging(loglevel):
+class _LogFormatter(logging.Formatter):
+    """Formatter that reuses the formatted timestamp within one second.
+
+    Only valid with a ``datefmt`` of second resolution.
+    """
+    _last = (None, "")
+
+    def formatTime(self, record, datefmt=None):
+        sec = int(record.created)
+        if sec != self._last[0]:
+            t = self.converter(sec)
+            self._last = (sec, time.strftime(datefmt or self.default_time_format, t))
+        return self._last[1]
+
+def setup_logging(loglevel, stream=None, buffered=True):
     """Setup basic logging
 
+    By default, records are buffered in a
+    :class:`logging.handlers.MemoryHandler` and written to ``stdout``
+    in one batch -- when an error is logged, when the buffer fills up,
+    or at exit.
+
+    Only the first call builds handlers; later calls just update the level.
+
     Args:
       loglevel (int): minimum loglevel for emitting messages
+      stream (file): where records are written (default ``stdout``)
+      buffered (bool): batch records up, or write each one as it comes
     """
+    global _log_handler, _configured_level
+
+    if _configured_level == loglevel:
+        return
+
+    root = logging.getLogger()
+    if _configured_level is not None: # already set up, only the level changes
+        root.setLevel(loglevel)
+        _configured_level = loglevel
+        return
+    _configured_level = loglevel
+
+    if root.handlers: # same as logging.basicConfig, leave existing setups alone
+        return
+
     logformat = "[%(asctime)s] %(levelname)s:%(name)s:%(message)s"
-    logging.basicConfig(
-        level=loglevel, stream=sys.stdout, format=logformat, datefmt="%Y-%m-%d %H:%M:%S"
-    )
+    handler = logging.StreamHandler(sys.stdout if stream is None else stream)
+    handler.setFormatter(_LogFormatter(logformat, datefmt="%Y-%m-%d %H:%M:%S"))
+    if buffered:
+        # deferred: logging.handlers pulls in socket, pickle, queue and threading
+        from logging.handlers import MemoryHandler
+        _log_handler = MemoryHandler(
+            capacity=1024, flushLevel=logging.ERROR, target=handler
+        )
+        atexit.register(_log_handler.flush)
+        handler = _log_handler
+    root.setLevel(loglevel)
+    root.addHandler(handler)
+
+def flush_logging():
+    """Write out any log records held back by :func:`setup_logging`."""
+    if _log_handler is not None:
+        _log_handler.flush()
+
+def write_output(text):
+    """Write ``text`` plus a newline to ``stdout`` as a single write.
+
+    When ``stdout`` is a pipe or a file, the bytes go straight to its
+    file descriptor with :func:`os.writev`, bypassing the io stack.
+    The newline is passed separately, so ``text`` is never copied just
+    to append it.
+
+    Args:
+      text (string): the text to emit
+    """
+    out = getattr(sys.stdout, "buffer", None)
+    if out is None: # stdout replaced by a text-only stream
+        w = sys.stdout.write
+        w(text)
+        w("\n")
+        return
+
+    data = text.encode(sys.stdout.encoding or "utf-8")
+    sys.stdout.flush()
+    try:
+        fd = sys.stdout.fileno()
+    except (AttributeError, OSError, ValueError): # no real file descriptor
+        fd = None
+
+    if fd is None or os.isatty(fd) or not hasattr(os, "writev"):
+        out.write(data)
+        out.write(b"\n")
+        out.flush()
+        return
+
+    n = os.writev(fd, (data, b"\n"))
+    if n <= len(data): # partial write on a pipe, finish the rest
+        view = memoryview(data)[n:]
+        while view:
+            view = view[os.write(fd, view):]
+        os.write(fd, b"\n")
+
+def serve(stream_in=None, stream_out=None):
+    """Answer package queries from a single long-running process.
+
+    Package names are read one per line from ``stream_in`` and the
+    :func:`slick` description of each is written to ``stream_out``,
+    followed by an empty line.  A query that fails is answered with
+    a single ``error: <message>`` line instead.  Loaded packages stay
+    cached between queries, so batch lookups only pay for importing
+    slick once.
+
+    Anything else written to ``stdout`` while loading a package
+    (e.g. a ``print`` in a recipe) is sent to ``stderr``, so that
+    ``stream_out`` only ever holds answers.
+
+    Args:
+      stream_in (file): text stream of package names (default ``stdin``)
+      stream_out (file): text stream for the answers (default ``stdout``)
+    """
+    stream_in = sys.stdin if stream_in is None else stream_in
+    stream_out = sys.stdout if stream_out is None else stream_out
+
+    for line in stream_in:
+        name = line.strip()
+        if not name:
+            continue
+        try:
+            with contextlib.redirect_stdout(sys.stderr):
+                ans = slick(name)
+        except Exception as err: # report the bad query and keep serving
+            ans = "error: {}".format(err)
+        stream_out.write(ans + "\n\n")
+        stream_out.flush()
 
 def main(argv):
     """CLI wrapper for slick.
 
     Instead of returning a value from :func:`slick`, it prints the result to the
     ``stdout`` in a nicely formatted message.
+
+    With ``--serve``, package names are read from ``stdin`` instead
+    (see :func:`serve`).
     """
-    assert len(argv) > 1, f"Usage: {argv[0]} <package dir>"
+    if len(argv) < 2: # not an assert, which python -O would strip
+        prog = argv[0] if argv else "slick"
+        sys.stderr.write(f"Usage: {prog} <package dir> | --serve\n")
+        sys.exit(2)
+
+    if argv[1] == "--serve":
+        # keep stdout for the answers, and don't hold records back
+        # in a process that may run for a long time
+        setup_logging(logging.WARNING, stream=sys.stderr, buffered=False)
+        serve()
+        return
 
     setup_logging(logging.INFO) # DEBUG
-    _logger.debug("Starting slick.")
+    if __debug__: # compiled out under python -O
+        _logger.debug("Starting slick.")
     ans = slick(argv[1])
     _logger.info("Completed slick.")
-    print(ans)
+    flush_logging()
+    write_output(ans)
 
 def run():
     """Calls :func:`main` passing the CLI arguments extracted from :obj:`sys.argv`
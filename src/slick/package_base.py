@@ -1,8 +1,16 @@
 from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type
-import inspect
+from functools import lru_cache, partial
+from itertools import chain
+import asyncio
+import bisect
+import os
+import re
+import sys
+import textwrap
 
 from .util.lang import classproperty, memoized
 from .directives import PackageMeta
+from .dependency import canonical_deptype
 
 
 FLAG_HANDLER_RETURN_TYPE = Tuple[
@@ -11,7 +19,40 @@ FLAG_HANDLER_RETURN_TYPE = Tuple[
 FLAG_HANDLER_TYPE = Callable[[str, Iterable[str]], FLAG_HANDLER_RETURN_TYPE]
 
 """Allowed URL schemes for spack packages."""
-_ALLOWED_URL_SCHEMES = ["http", "https", "ftp", "file", "git"]
+_ALLOWED_URL_SCHEMES = frozenset(("http", "https", "ftp", "file", "git"))
+
+def _patch_hash_content(patch):
+    """The ``sha256:level`` bytes a patch contributes to ``content_hash()``.
+
+    These never change for a given patch, so they are encoded once and
+    kept on the patch object.
+    """
+    encoded = getattr(patch, "_hash_content", None)
+    if encoded is None:
+        encoded = ":".join((patch.sha256, str(patch.level))).encode("utf-8")
+        patch._hash_content = encoded
+    return encoded
+
+def _lib_dirs(prefix, names):
+    """The subset of ``names`` that are directories directly under ``prefix``.
+
+    A single scandir() replaces one isdir() stat per name.
+    """
+    try:
+        with os.scandir(prefix) as entries:
+            return {e.name for e in entries if e.name in names and e.is_dir()}
+    except OSError:
+        return set()
+
+_WS = re.compile(r"\s+")
+
+@lru_cache(maxsize=None)
+def _wrap_doc(doc, indent):
+    """Body of ``PackageBase.format_doc``; docstrings don't change, so
+    each (doc, indent) pair is only wrapped once.
+    """
+    pad = " " * indent
+    return "".join([pad + line + "\n" for line in textwrap.wrap(_WS.sub(" ", doc), 72)])
 
 class PackageBase(metaclass=PackageMeta):
     """This is the superclass for all Slick packages.
@@ -156,17 +197,19 @@ class PackageBase(metaclass=PackageMeta):
     maintainers: List[str] = []
 
     #: List of attributes to be excluded from a package's hash.
-    metadata_attrs = [
-        "homepage",
-        "url",
-        "urls",
-        "list_url",
-        "extendable",
-        "parallel",
-        "make_jobs",
-        "maintainers",
-        "tags",
-    ]
+    metadata_attrs = frozenset(
+        (
+            "homepage",
+            "url",
+            "urls",
+            "list_url",
+            "extendable",
+            "parallel",
+            "make_jobs",
+            "maintainers",
+            "tags",
+        )
+    )
 
     #: Boolean. If set to ``True``, the smoke/install test requires a compiler.
     #: This is currently used by smoke tests to ensure a compiler is available
@@ -204,14 +247,26 @@ class PackageBase(metaclass=PackageMeta):
         # Set up timing variables
         self._fetch_time = 0.0
 
-        self.win_rpath = fsys.WindowsSimulatedRPath(self)
-
-        if self.is_extension:
+        # is_extension is always False without extendees, and testing
+        # those first skips looking at the spec for most packages.
+        if self.extendees and self.is_extension:
             pkg_cls = spack.repo.path.get_pkg_class(self.extendee_spec.name)
             pkg_cls(self.extendee_spec)._check_extendable()
 
         super(PackageBase, self).__init__()
 
+    _win_rpath = None
+
+    @property
+    def win_rpath(self):
+        """Simulated RPATH handler for Windows, created on first use.
+
+        Most instances never touch it, e.g. on Linux and macOS.
+        """
+        if self._win_rpath is None:
+            self._win_rpath = fsys.WindowsSimulatedRPath(self)
+        return self._win_rpath
+
     @classmethod
     def possible_dependencies(
         cls,
@@ -255,43 +310,71 @@ class PackageBase(metaclass=PackageMeta):
         Note: the returned dict *includes* the package itself.
 
         """
-        deptype = spack.dependency.canonical_deptype(deptype)
+        # canonicalized once for the whole traversal
+        deptype = frozenset(canonical_deptype(deptype))
 
         visited = {} if visited is None else visited
         missing = {} if missing is None else missing
 
-        visited.setdefault(cls.name, set())
-
-        for name, conditions in cls.dependencies.items():
-            # check whether this dependency could be of the type asked for
-            types = [dep.type for cond, dep in conditions.items()]
-            types = set.union(*types)
-            if not any(d in types for d in deptype):
-                continue
-
-            # expand virtuals if enabled, otherwise just stop at virtuals
-            if spack.repo.path.is_virtual(name):
-                if virtuals is not None:
-                    virtuals.add(name)
-                if expand_virtuals:
-                    providers = spack.repo.path.providers_for(name)
-                    dep_names = [spec.name for spec in providers]
+        # repository answers for names reached from several packages
+        virtual_cache = {}
+        providers_cache = {}
+
+        def expand(pkg_cls):
+            # Edges out of pkg_cls, yielded one at a time so that each
+            # dependency is visited before the next one is even considered,
+            # in the same (depth-first) order as a recursive walk.
+            # names are repeated across many sets; share one string object each
+            pkg_name = sys.intern(pkg_cls.name)
+            own = visited.setdefault(pkg_name, set())
+
+            for name, conditions in pkg_cls.dependencies.items():
+                # check whether this dependency could be of the type asked for
+                for dep in conditions.values():
+                    if not deptype.isdisjoint(dep.type):
+                        break
                 else:
-                    visited.setdefault(cls.name, set()).add(name)
-                    visited.setdefault(name, set())
                     continue
-            else:
-                dep_names = [name]
 
-            # add the dependency names to the visited dict
-            visited.setdefault(cls.name, set()).update(set(dep_names))
+                name = sys.intern(name)
+
+                # expand virtuals if enabled, otherwise just stop at virtuals
+                is_virtual = virtual_cache.get(name)
+                if is_virtual is None:
+                    is_virtual = spack.repo.path.is_virtual(name)
+                    virtual_cache[name] = is_virtual
+
+                if is_virtual:
+                    if virtuals is not None:
+                        virtuals.add(name)
+                    if expand_virtuals:
+                        dep_names = providers_cache.get(name)
+                        if dep_names is None:
+                            providers = spack.repo.path.providers_for(name)
+                            dep_names = [sys.intern(spec.name) for spec in providers]
+                            providers_cache[name] = dep_names
+                    else:
+                        own.add(name)
+                        visited.setdefault(name, set())
+                        continue
+                else:
+                    dep_names = [name]
+
+                # add the dependency names to the visited dict
+                own.update(dep_names)
+
+                for dep_name in dep_names:
+                    yield pkg_name, dep_name
 
-            # recursively traverse dependencies
-            for dep_name in dep_names:
+        # an explicit stack of edge iterators instead of recursion,
+        # so deep DAGs can't overflow the stack
+        stack = [expand(cls)]
+        while stack:
+            for pkg_name, dep_name in stack[-1]:
                 if dep_name in visited:
                     continue
 
-                visited.setdefault(dep_name, set())
+                visited[dep_name] = set()
 
                 # skip the rest if not transitive
                 if not transitive:
@@ -301,12 +384,14 @@ class PackageBase(metaclass=PackageMeta):
                     dep_cls = spack.repo.path.get_pkg_class(dep_name)
                 except spack.repo.UnknownPackageError:
                     # log unknown packages
-                    missing.setdefault(cls.name, set()).add(dep_name)
+                    missing.setdefault(pkg_name, set()).add(dep_name)
                     continue
 
-                dep_cls.possible_dependencies(
-                    transitive, expand_virtuals, deptype, visited, missing, virtuals
-                )
+                # descend; the rest of this iterator resumes afterwards
+                stack.append(expand(dep_cls))
+                break
+            else:
+                stack.pop()
 
         return visited
 
@@ -317,16 +402,11 @@ class PackageBase(metaclass=PackageMeta):
 
     @classproperty
     def fullnames(cls):
-        """Fullnames for this package and any packages from which it inherits."""
-        fullnames = []
-        for cls in inspect.getmro(cls):
-            namespace = getattr(cls, "namespace", None)
-            if namespace:
-                fullnames.append("%s.%s" % (namespace, cls.name))
-            if namespace == "builtin":
-                # builtin packages cannot inherit from other repos
-                break
-        return fullnames
+        """Fullnames for this package and any packages from which it inherits.
+
+        Computed once, by ``PackageMeta``, when the class is created.
+        """
+        return cls._fullnames
 
     @classproperty
     def name(cls):
@@ -365,7 +445,6 @@ class PackageBase(metaclass=PackageMeta):
         return self.spec.versions[0]
 
     @classmethod
-    @memoized
     def version_urls(cls):
         """OrderedDict of explicitly defined URLs for versions of this package.
 
@@ -377,11 +456,13 @@ class PackageBase(metaclass=PackageMeta):
         explicitly defined ``url`` argument. So, this list may be empty
         if a package only defines ``url`` at the top level.
         """
-        version_urls = collections.OrderedDict()
-        for v, args in sorted(cls.versions.items()):
-            if "url" in args:
-                version_urls[v] = args["url"]
-        return version_urls
+        if cls._version_urls is None:
+            version_urls = collections.OrderedDict()
+            for v, args in sorted(cls.versions.items()):
+                if "url" in args:
+                    version_urls[v] = args["url"]
+            cls._version_urls = version_urls
+        return cls._version_urls
 
     def nearest_url(self, version):
         """Finds the URL with the "closest" version to ``version``.
@@ -398,14 +479,20 @@ class PackageBase(metaclass=PackageMeta):
         if version in version_urls:
             return version_urls[version]
 
-        last_url = None
-        for v, u in self.version_urls().items():
-            if v > version:
-                if last_url:
-                    return last_url
-            last_url = u
+        versions, urls = self._sorted_version_urls()
+        if not versions:
+            return None
+
+        i = bisect.bisect_right(versions, version)
+        return urls[i - 1] if i > 0 else urls[0]
 
-        return last_url
+    @classmethod
+    def _sorted_version_urls(cls):
+        """``version_urls()`` as parallel (versions, urls) tuples, sorted by version."""
+        if cls._version_url_index is None:
+            version_urls = cls.version_urls()
+            cls._version_url_index = (tuple(version_urls), tuple(version_urls.values()))
+        return cls._version_url_index
 
     def url_for_version(self, version):
         """Returns a URL from which the specified version of this package
@@ -440,18 +527,23 @@ class PackageBase(metaclass=PackageMeta):
         if not isinstance(version, VersionBase):
             version = Version(version)
 
-        urls = []
+        # read each of these once; they may be inherited or properties
+        url = getattr(self, "url", None)
+        class_urls = getattr(self, "urls", None) or ()
+
+        # URLs in order of preference; a dict so duplicates are dropped in O(1)
+        urls: Dict[str, None] = {}
 
         # If we have a specific URL for this version, don't extrapolate.
         version_urls = self.version_urls()
         if version in version_urls:
-            urls.append(version_urls[version])
+            urls[version_urls[version]] = None
 
         # if there is a custom url_for_version, use it
         if custom_url_for_version is not None:
             u = custom_url_for_version(version)
-            if u not in urls and u is not None:
-                urls.append(u)
+            if u is not None:
+                urls[u] = None
 
         def sub_and_add(u):
             if u is None:
@@ -463,18 +555,18 @@ class PackageBase(metaclass=PackageMeta):
                 return
             nu = spack.url.substitute_version(u, self.url_version(version))
 
-            urls.append(nu)
+            urls[nu] = None
 
         # If no specific URL, use the default, class-level URL
-        sub_and_add(getattr(self, "url", None))
-        for u in getattr(self, "urls", []):
+        sub_and_add(url)
+        for u in class_urls:
             sub_and_add(u)
 
         sub_and_add(getattr(self, "list_url", None))
 
         # if no version-bearing URLs can be found, try them raw
         if not urls:
-            default_url = getattr(self, "url", getattr(self, "urls", [None])[0])
+            default_url = url or (class_urls[0] if class_urls else None)
 
             # if no exact match AND no class-level default, use the nearest URL
             if not default_url:
@@ -483,9 +575,9 @@ class PackageBase(metaclass=PackageMeta):
                 # if there are NO URLs to go by, then we can't do anything
                 if not default_url:
                     raise NoURLError(self.__class__)
-            urls.append(spack.url.substitute_version(default_url, self.url_version(version)))
+            urls[spack.url.substitute_version(default_url, self.url_version(version))] = None
 
-        return urls
+        return list(urls)
 
     def find_valid_url_for_version(self, version):
         """Returns a URL from which the specified version of this package
@@ -515,11 +607,14 @@ class PackageBase(metaclass=PackageMeta):
         so something may be a build dependency in one configuration and a
         run dependency in another.
         """
-        return dict(
-            (name, conds)
-            for name, conds in cls.dependencies.items()
-            if any(dt in cls.dependencies[name][cond].type for cond in conds for dt in deptypes)
-        )
+        deptypes = frozenset(deptypes)
+        result = {}
+        for name, conds in cls.dependencies.items():
+            for dep in conds.values():
+                if not deptypes.isdisjoint(dep.type):
+                    result[name] = conds
+                    break
+        return result
 
     @property
     def extendee_spec(self):
@@ -589,14 +684,27 @@ class PackageBase(metaclass=PackageMeta):
         s = self.extendee_spec
         return s and spec.satisfies(s)
 
+    @classproperty
+    def provided_by_name(cls):
+        """``provided`` indexed by virtual package name.
+
+        Maps each name to the list of constraint sets under which this
+        package provides it.
+        """
+        if cls._provided_by_name is None:
+            index = {}
+            for s, constraints in cls.provided.items():
+                index.setdefault(s.name, []).append(constraints)
+            cls._provided_by_name = index
+        return cls._provided_by_name
+
     def provides(self, vpkg_name):
         """
         True if this package provides a virtual package with the specified name
         """
         return any(
             any(self.spec.intersects(c) for c in constraints)
-            for s, constraints in self.provided.items()
-            if s.name == vpkg_name
+            for constraints in self.provided_by_name.get(vpkg_name, ())
         )
 
     @property
@@ -670,19 +778,13 @@ class PackageBase(metaclass=PackageMeta):
 
         Retrieves patches on the package itself as well as patches on the
         dependencies of the package."""
-        patches = []
-        for _, patch_list in cls.patches.items():
-            for patch in patch_list:
-                patches.append(patch)
-
-        pkg_deps = cls.dependencies
-        for dep_name in pkg_deps:
-            for _, dependency in pkg_deps[dep_name].items():
-                for _, patch_list in dependency.patches.items():
-                    for patch in patch_list:
-                        patches.append(patch)
-
-        return patches
+        own_patches = chain.from_iterable(cls.patches.values())
+        dep_patches = chain.from_iterable(
+            chain.from_iterable(dependency.patches.values())
+            for conditions in cls.dependencies.values()
+            for dependency in conditions.values()
+        )
+        return list(chain(own_patches, dep_patches))
 
     def content_hash(self, content=None):
         """Create a hash based on the artifacts and patches used to build this package.
@@ -730,17 +832,18 @@ class PackageBase(metaclass=PackageMeta):
         # We check spec._patches_assigned instead of spec.concrete because
         # we have to call package_hash *before* marking specs concrete
         if self.spec._patches_assigned():
-            hash_content.extend(
-                ":".join((p.sha256, str(p.level))).encode("utf-8") for p in self.spec.patches
-            )
+            hash_content.extend(_patch_hash_content(p) for p in self.spec.patches)
 
         # package.py contents
         hash_content.append(package_hash(self.spec, source=content).encode("utf-8"))
 
         # put it all together and encode as base32
-        b32_hash = base64.b32encode(
-            hashlib.sha256(bytes().join(sorted(hash_content))).digest()
-        ).lower()
+        # (hashing the sorted pieces one by one gives the same digest as
+        # hashing their concatenation, without building that buffer)
+        sha = hashlib.sha256()
+        for chunk in sorted(hash_content):
+            sha.update(chunk)
+        b32_hash = base64.b32encode(sha.digest()).lower()
         b32_hash = b32_hash.decode("utf-8")
 
         return b32_hash
@@ -846,12 +949,7 @@ class PackageBase(metaclass=PackageMeta):
         if not cls.__doc__:
             return ""
 
-        doc = re.sub(r"\s+", " ", cls.__doc__)
-        lines = textwrap.wrap(doc, 72)
-        results = io.StringIO()
-        for line in lines:
-            results.write((" " * indent) + line + "\n")
-        return results.getvalue()
+        return _wrap_doc(cls.__doc__, indent)
 
     @property
     def all_urls(self):
@@ -860,20 +958,21 @@ class PackageBase(metaclass=PackageMeta):
         Check both class-level and version-specific URLs.
 
         Returns:
-            list: a list of URLs
+            list: a list of unique URLs, in order of first appearance
         """
-        urls = []
+        # ordered set, so no URL is fetched twice
+        urls: Dict[str, None] = {}
         if hasattr(self, "url") and self.url:
-            urls.append(self.url)
+            urls[self.url] = None
 
         # fetch from first entry in urls to save time
         if hasattr(self, "urls") and self.urls:
-            urls.append(self.urls[0])
+            urls[self.urls[0]] = None
 
         for args in self.versions.values():
             if "url" in args:
-                urls.append(args["url"])
-        return urls
+                urls[args["url"]] = None
+        return list(urls)
 
     def fetch_remote_versions(self, concurrency=128):
         """Find remote versions of this package.
@@ -893,20 +992,50 @@ class PackageBase(metaclass=PackageMeta):
         except spack.util.web.NoNetworkConnectionError as e:
             tty.die("Package.fetch_versions couldn't connect to:", e.url, e.message)
 
+    async def fetch_remote_versions_async(self, concurrency=128):
+        """Awaitable form of :meth:`fetch_remote_versions`.
+
+        The crawl runs in the event loop's default executor, so version
+        discovery for many packages can be overlapped with
+        ``asyncio.gather`` instead of being done one package at a time.
+        The sync wrapper remains ``fetch_remote_versions``.
+
+        Returns:
+            dict: a dictionary mapping versions to URLs
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(self.fetch_remote_versions, concurrency))
+
+    #: (spec, rpaths) once every link dependency of a concrete spec is installed
+    _rpath = None
+
     @property
     def rpath(self):
-        """Get the rpath this package links with, as a list of paths."""
+        """Get the rpath this package links with, as a list of paths.
+
+        The directory scan is kept only once the spec is concrete and all
+        of its link dependencies are installed; before that, their lib
+        directories may still appear.
+        """
+        cached = self._rpath
+        if cached is not None and cached[0] is self.spec:
+            return list(cached[1])
+
         deps = self.spec.dependencies(deptype="link")
 
         # on Windows, libraries of runtime interest are typically
         # stored in the bin directory
         if sys.platform == "win32":
             rpaths = [self.prefix.bin]
-            rpaths.extend(d.prefix.bin for d in deps if os.path.isdir(d.prefix.bin))
+            rpaths.extend(d.prefix.bin for d in deps if "bin" in _lib_dirs(d.prefix, ("bin",)))
         else:
             rpaths = [self.prefix.lib, self.prefix.lib64]
-            rpaths.extend(d.prefix.lib for d in deps if os.path.isdir(d.prefix.lib))
-            rpaths.extend(d.prefix.lib64 for d in deps if os.path.isdir(d.prefix.lib64))
+            found = [(d, _lib_dirs(d.prefix, ("lib", "lib64"))) for d in deps]
+            rpaths.extend(d.prefix.lib for d, dirs in found if "lib" in dirs)
+            rpaths.extend(d.prefix.lib64 for d, dirs in found if "lib64" in dirs)
+
+        if self.spec.concrete and all(d.installed for d in deps):
+            self._rpath = (self.spec, tuple(rpaths))
         return rpaths
 
     @property
@@ -914,5 +1043,5 @@ class PackageBase(metaclass=PackageMeta):
         """
         Get the rpath args as a string, with -Wl,-rpath, for each element
         """
-        return " ".join("-Wl,-rpath,%s" % p for p in self.rpath)
+        return " ".join(["-Wl,-rpath," + p for p in self.rpath])
 
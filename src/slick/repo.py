@@ -3,32 +3,80 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
-from typing import Union
+from typing import Dict, Tuple
 
+import hashlib
+import os
+import sys
 import importlib
 import importlib.machinery
 import importlib.util
-from pathlib import Path
+
+#: Package classes loaded so far, keyed by the absolute path of their
+#: package.py (so "libc", "./libc" and "libc/" share an entry, and a
+#: chdir can't alias two recipes).  Each entry stores the st_mtime_ns
+#: of that file, so that edits to the recipe invalidate the cached class.
+_package_cache : Dict[str, Tuple[int, type]] = {}
+
+#: Recipe modules live under this prefix in sys.modules, so a recipe
+#: named after a real module (yaml, zlib, six, ...) never shadows it.
+_MODULE_PREFIX = "slick.pkgs."
+
+def _module_name(clsname : str, path : str) -> str:
+    # A digest of the recipe's absolute path keeps same-named
+    # recipes from different repos in separate modules.
+    digest = hashlib.sha1(path.encode("utf-8")).hexdigest()[:12]
+    return "{}{}_{}".format(_MODULE_PREFIX, digest, clsname)
 
 # short name of the package
 def short_name(package_name : str) -> str:
-    return Path(package_name).stem
+    base = os.path.basename(package_name.rstrip(os.sep))
+    return os.path.splitext(base)[0]
 
 def load_package(package_name : str):
     # FIXME: just using file paths for now
-    path = Path(package_name) / "package.py"
+    path = os.path.abspath(os.path.join(package_name, "package.py"))
+    mtime = os.stat(path).st_mtime_ns
+
+    cached = _package_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    cls = _load_package(package_name, path)
+    _package_cache[path] = (mtime, cls)
+    return cls
+
+def _load_package(package_name : str, path : str):
     clsname = short_name(package_name)
 
-    fullname = package_name.replace('/', '.')
-    loader = importlib.machinery.SourceFileLoader(fullname, str(path))
+    fullname = _module_name(clsname, path)
+    # SourceFileLoader persists the compiled recipe under __pycache__,
+    # keyed by the source mtime and size, so a cold start only
+    # re-compiles package.py files that changed since the last run.
+    loader = importlib.machinery.SourceFileLoader(fullname, path)
     spec   = importlib.util.spec_from_loader(fullname, loader)
     mod    = importlib.util.module_from_spec(spec)
-    loader.exec_module(mod)
 
-    names = []
-    for name in dir(mod):
-        if name.lower() == clsname.lower():
-            names.append(name)
+    # Register the module before running it, as the import system does,
+    # so that package.py can import itself (or be imported back) while
+    # it is executing. If it fails, put back whatever was there before,
+    # e.g. the last good version of an edited recipe.
+    prev = sys.modules.get(fullname)
+    sys.modules[fullname] = mod
+    try:
+        loader.exec_module(mod)
+    except BaseException:
+        if prev is None:
+            sys.modules.pop(fullname, None)
+        else:
+            sys.modules[fullname] = prev
+        raise
+
+    # Only the module's own namespace is searched (not dir(), which sorts
+    # every star-imported name), and only classes can match.
+    lower = clsname.lower()
+    names = [name for name, value in mod.__dict__.items()
+             if isinstance(value, type) and name.lower() == lower]
     if len(names) > 1:
         raise ImportError("Multiple classes in module match {}".format(clsname))
     if len(names) == 0:
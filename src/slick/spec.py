@@ -1,10 +1,10 @@
-from typing import Dict, Optional, List, Tuple, Set
+from typing import Dict, FrozenSet, Optional, List, Tuple, Set
 from enum import Enum
+from functools import lru_cache
+import re
+import sys
 
-from pydantic import BaseModel
-from parsimonious.grammar import Grammar
-from parsimonious.nodes import NodeVisitor
-from parsimonious.exceptions import IncompleteParseError
+import msgspec
 
 """
 A Spec is a set of constraints, each of which lists a requirement
@@ -42,21 +42,30 @@ Dependency specs: (^callpath@1.1)
 
 identifier_re = r"\w[-/.\w]*"
 
+# keys set by an arch=platform-os-target-gpu_arch specifier, interned so
+# every spec's variant dict shares the same key objects.
+_ARCH_KEYS = tuple(sys.intern(key) for key in ("platform", "os", "target", "gpu_arch"))
+
 # these variants must have string values
-variant_kws = set("arch platform os target gpu_arch cflags cxxflags fflags cppflags ldflags ldlibs".split())
+variant_kws = frozenset(sys.intern(key) for key in
+        "arch platform os target gpu_arch cflags cxxflags fflags cppflags ldflags ldlibs".split())
 
 # these variants must have bool values
-#variant_bools = "debug test".split()
-variant_bools = set()
+#variant_bools = frozenset(sys.intern(key) for key in "debug test".split())
+variant_bools = frozenset()
 
 # The defaults for each of these types below
 # define a non-constraining, "any", value.
-class VersionRange(BaseModel):
+#
+# Structs are slotted (no per-instance __dict__).
+# Leaf values are frozen (hashable, and safe to share between specs);
+# Spec and Compiler are filled in place while parsing.
+class VersionRange(msgspec.Struct, kw_only=True, frozen=True, gc=False):
     lo:      Optional[Tuple[int,int,int]] = None
     hi:      Optional[Tuple[int,int,int]] = None
     ext:     str = "" # must match ext2 up to smaller of 2 string lengths.
 
-class VersionInstance(BaseModel):
+class VersionInstance(msgspec.Struct, kw_only=True, frozen=True, gc=False):
     semver:  Tuple[int,int,int]
     ext:     str = ""
 
@@ -66,72 +75,73 @@ class VariantType(str, Enum):
     multi   = 'multi'
 
 # enable applies to bool-valued specs
-# anyof  applies to single and multi-valued specs
+# value  applies to single-valued specs
+#        - the one value allowed, stored as a plain str
+#        - If value is None, this constraint is not active
+# anyof  applies to multi-valued specs
 #        - values not in the list are not allowed
 #        - If anyof is empty, this constraint is not active
 #          (since we don't ever form internally contradictory specs).
 # allof  applies only to multi-valued specs and is an "and"-list
 #        - values not in the list are also allowed
-class VariantValue(BaseModel):
+class VariantValue(msgspec.Struct, kw_only=True, frozen=True, gc=False):
     type:      VariantType
-    enable:    Optional[bool] = None
-    anyof:     Set[str]       = set()
-    allof:     Set[str]       = set()
-    propagate: bool           = False
+    enable:    Optional[bool]  = None
+    value:     Optional[str]   = None
+    anyof:     FrozenSet[str]  = frozenset()
+    allof:     FrozenSet[str]  = frozenset()
+    propagate: bool            = False
 
-class VariantInstance(BaseModel):
+class VariantInstance(msgspec.Struct, kw_only=True, frozen=True, gc=False):
     type:      VariantType
     enable:    Optional[bool] = None
-    value:     Set[str]       = set()
+    value:     FrozenSet[str] = frozenset()
 
-class Compiler(BaseModel):
+class Compiler(msgspec.Struct, kw_only=True):
     name:    str = ""
     version: Set[VersionRange] = set()
     variant: Dict[str,VariantValue] = {}
 
-class CompilerConfig(BaseModel):
+class CompilerConfig(msgspec.Struct, kw_only=True):
     name:    str
     version: VersionInstance
     variant: Dict[str,VariantInstance] = {}
 
-class Spec(BaseModel):
+class Spec(msgspec.Struct, kw_only=True):
     name:          str
     version:       Set[VersionRange]      = set()
     variant:       Dict[str,VariantValue] = {}
     deps:          Dict[str,"Spec"]       = {}
-    compiler:      Compiler               = Compiler()
+    compiler:      Compiler               = msgspec.field(default_factory=Compiler)
 
-class PackageConfig(BaseModel):
+class PackageConfig(msgspec.Struct, kw_only=True):
     name:     str
     version:  VersionInstance
     variant:  Dict[str,VariantInstance] = {}
     deps:     Dict[str,"PackageConfig"] = {}
     compiler: CompilerConfig
 
-grammar = Grammar(
+# Tokens that may follow the package name in a spec string.
+# Each alternative is a named group, so match.lastgroup names the token.
+_semver_re  = r"[0-9]+(?:\.[0-9]+){0,2}"
+_version_re = r"@(?::\s*%(v)s|%(v)s(?:\s*:(?:\s*%(v)s)?)?)" % {"v": _semver_re}
+_token_re   = re.compile(
     r"""
-    spec        = word specifier* ws
-    specifier   = (ws1 variantone)
-                / (ws variantbool)
-                / (ws version)
-                / (ws compiler)
-
-    variantone  = word equal word
-    variantbool = ~r"\+\+|--|~~|\+|-|~" ws word
-
-    version     = ("@:" ws semver) / ("@" semver (ws ":" (ws semver)?)?)
-
-    compiler    = "%%" ws word ws version?
-
-    semver      = ~r"[0-9]+(\.[0-9]+){0,2}"
+      (?P<ws>          \s+ )
+    | (?P<variantone>  (?P<key>%(w)s) \s* (?P<eq>==?) \s* (?P<value>%(w)s) )
+    | (?P<variantbool> (?P<flag>\+\+|--|~~|\+|-|~) \s* (?P<boolkey>%(w)s) )
+    | (?P<version>     %(v)s )
+    | (?P<compiler>    %%\s*(?P<compname>%(w)s) (?:\s*%(v)s)? )
+    """ % {"w": identifier_re, "v": _version_re},
+    re.VERBOSE,
+)
+_name_re = re.compile(identifier_re)
 
-    word        = ~r"%s"
-    equal       = ws ~r"={1,2}" ws
+# A spec that is just a package name, e.g. "hdf5".
+_BARE = re.compile(r"\A%s\Z" % identifier_re)
 
-    ws          = ~r"\s*"
-    ws1         = ~r"\s+"
-    """ % identifier_re
-)
+class SpecSyntaxError(ValueError):
+    """Raised when a string cannot be parsed as a spec."""
 
 # Return the logical "and" of two variant values,
 # or else None if there is no mutual solution.
@@ -142,14 +152,35 @@ def unify_variants(x : VariantValue, y : VariantValue) -> Optional[VariantValue]
     if x.enable != y.enable:
         return None
 
-    if len(x.anyof) > 0 and len(y.anyof) > 0:
-        anyof = x.anyof & y.anyof
-        if len(anyof) == 0:
+    if x.type is VariantType.single:
+        if x.value is None:
+            value = y.value
+        elif y.value is None or x.value == y.value:
+            value = x.value
+        else:
             return None
+        return VariantValue(
+                  type   = x.type
+                , value  = value
+                , propagate = x.propagate or y.propagate)
+
+    # An empty anyof is unconstrained, and the sets are frozen,
+    # so the other operand can be reused as-is.
+    if not x.anyof:
+        anyof = y.anyof
+    elif not y.anyof:
+        anyof = x.anyof
     else:
-        anyof = x.anyof | y.anyof
+        anyof = x.anyof & y.anyof
+        if not anyof:
+            return None
 
-    allof = x.allof | y.allof
+    if not x.allof:
+        allof = y.allof
+    elif not y.allof:
+        allof = x.allof
+    else:
+        allof = x.allof | y.allof
 
     return VariantValue(
               type   = x.type
@@ -167,73 +198,115 @@ def update_variant(s : Spec, name : str, val : VariantValue):
 
     s.variant[name] = val
 
-def update_arch(s : Spec, vals : str, prop : bool) -> None:
-    kws = "platform-os-target-gpu_arch"
-    for key, val in zip(kws.split("-"), vals.split("-")):
+def _update_arch_key(s : Spec, key : str, val : str, prop : bool) -> None:
+    # "nil" is an unspecified field, e.g. arch=linux-nil-haswell
+    if val != "nil":
         update_variant(s, key, VariantValue(
-            type=VariantType.single, anyof=set([val]), propagate=prop))
+            type=VariantType.single, value=val, propagate=prop))
+
+def update_arch(s : Spec, vals : str, prop : bool) -> None:
+    parts = vals.split("-", 3)
+    n = len(parts)
+    _update_arch_key(s, _ARCH_KEYS[0], parts[0], prop)
+    if n > 1:
+        _update_arch_key(s, _ARCH_KEYS[1], parts[1], prop)
+    if n > 2:
+        _update_arch_key(s, _ARCH_KEYS[2], parts[2], prop)
+    if n > 3:
+        _update_arch_key(s, _ARCH_KEYS[3], parts[3], prop)
 
 # TODO:
 #   compiler:      Compiler
 #   compilerflags: List[str]
 #   deps:          Dict[str,"Spec"]
 
-""" Mutating parser that builds up the result in self.spec.
-"""
-class SpecVisitor(NodeVisitor):
-    def __init__(self):
-        self.spec = Spec(name = "")
-        super(NodeVisitor).__init__()
-
-    def visit_spec(self, node, visited_children):
-        self.spec.name = node.children[0].text
-        return self.spec
-
-    def visit_variantone(self, node, visited_children):
-        """ Gets each key/value pair, returns a tuple. """
-        key, eq, value = visited_children
-        if key in variant_bools:
-            raise KeyError("Reserved variant {} must be a bool, not a string.".format(key))
-        prop = len(eq) > 0
-        if key == "arch":
-            update_arch(self.spec, value, prop)
-        else:
-            update_variant(self.spec, key,
-                           VariantValue(type=VariantType.single,
-                                        anyof=set([value]),
-                                        propagate=prop))
-
-    def visit_variantbool(self, node, visited_children):
-        flag, _, key  = visited_children
-        if flag in variant_kws:
-            raise KeyError("Reserved variant {} must be a string, not a bool.".format(flag))
-        val  = (flag[0] == "+")
-        prop = len(flag) > 1
-        update_variant(self.spec, key,
-                       VariantValue(type=VariantType.bool,
-                                    enable=val,
-                                    propagate=prop))
-
-    def visit_equal(self, node, visited_children):
-        return visited_children[1]
-
-    def generic_visit(self, node, visited_children):
-        """ The generic visit method. """
-        return visited_children or node.text
+def _copy_spec(s : Spec) -> Spec:
+    # VariantValue and VersionRange are frozen, so only the
+    # containers holding them need to be copied.
+    return Spec(name     = s.name,
+                version  = set(s.version),
+                variant  = dict(s.variant),
+                deps     = {k: _copy_spec(v) for k, v in s.deps.items()},
+                compiler = Compiler(name    = s.compiler.name,
+                                    version = set(s.compiler.version),
+                                    variant = dict(s.compiler.variant)))
 
 def parse_spec(info : str) -> Spec:
-    parse = grammar.parse(info)
-    return SpecVisitor().visit(parse)
+    """ Parse a spec string, e.g. "llvm +cheese ~sausage os=CNL10".
+
+    The same strings come up over and over (e.g. every when= of a
+    package), so parses are cached. Callers are free to modify the
+    result: each call returns its own copy.
+    """
+    if _BARE.match(info):
+        return Spec(name = info)
+    return _copy_spec(_parse_spec(info))
+
+@lru_cache(maxsize=8192)
+def _parse_spec(info : str) -> Spec:
+    """ The string is tokenized with a single precompiled regex and each
+    token is applied to the result as soon as it is seen.
+    """
+    m = _name_re.match(info)
+    if m is None:
+        raise SpecSyntaxError("Invalid spec {!r}: expected a package name".format(info))
+    s = Spec(name = m.group())
+
+    pos = m.end()
+    end = len(info)
+    spaced = False # whether whitespace precedes the current token
+    while pos < end:
+        m = _token_re.match(info, pos)
+        kind = m.lastgroup if m else None
+        if kind is None or (kind == "variantone" and not spaced):
+            raise SpecSyntaxError("Invalid spec {!r}: unexpected {!r} at position {}"
+                                  .format(info, info[pos:], pos))
+        pos = m.end()
+
+        if kind == "ws":
+            spaced = True
+            continue
+        spaced = False
+
+        if kind == "variantone":
+            key, eq, value = m.group("key", "eq", "value")
+            key = sys.intern(key)
+            if key in variant_bools:
+                raise KeyError("Reserved variant {} must be a bool, not a string.".format(key))
+            prop = len(eq) > 1
+            if key == "arch":
+                update_arch(s, value, prop)
+            else:
+                update_variant(s, key,
+                               VariantValue(type=VariantType.single,
+                                            value=value,
+                                            propagate=prop))
+        elif kind == "variantbool":
+            flag, key = m.group("flag", "boolkey")
+            key = sys.intern(key)
+            if key in variant_kws:
+                raise KeyError("Reserved variant {} must be a string, not a bool.".format(key))
+            update_variant(s, key,
+                           VariantValue(type=VariantType.bool,
+                                        enable=(flag[0] == "+"),
+                                        propagate=len(flag) > 1))
+        elif kind == "compiler":
+            name = m.group("compname")
+            if s.compiler.name and s.compiler.name != name:
+                raise KeyError("Incompatible compilers: {} and {}".format(s.compiler.name, name))
+            s.compiler.name = name
+        # TODO: version ranges (of the package and of its compiler) are
+        # accepted, but not recorded in s.version / s.compiler.version yet.
+
+    return s
 
 def test_spec():
     try:
-        parse = grammar.parse('llvm +cheese ~sausage false=true os=CNL10 arch=cray-CNL10-haswell')
-    except IncompleteParseError as err:
+        spec = parse_spec('llvm +cheese ~sausage false=true os=CNL10 arch=cray-CNL10-haswell')
+    except SpecSyntaxError as err:
         print(err)
         return
 
-    sv = SpecVisitor()
-    spec = sv.visit(parse)
     print(spec)
 
 if __name__=="__main__":
@@ -1,4 +1,6 @@
 class Variant:
+    __slots__ = ("name", "default", "description", "values", "multi", "validator", "sticky")
+
     def __init__(self, name, default, description, values, multi, validator, sticky):
         self.name = name
         self.default = default
@@ -7,3 +9,11 @@ class Variant:
         self.multi = multi
         self.validator = validator
         self.sticky = sticky
+
+    def __repr__(self):
+        return (
+            f"Variant({self.name!r}, default={self.default!r}, "
+            f"description={self.description!r}, values={self.values!r}, "
+            f"multi={self.multi!r}, validator={self.validator!r}, "
+            f"sticky={self.sticky!r})"
+        )
@@ -1,4 +1,4 @@
-from slick.packge import *
+from slick.package import *
 
 class Libc(BundlePackage):
     """Dummy package to provide interfaces available in libc."""
@@ -0,0 +1,79 @@
+import io
+import os
+import re
+
+from slick.main import serve, slick
+from slick.repo import load_package
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+
+def test_serve(capsys):
+    pkg = os.path.join(TESTS, "testpkg")
+    missing = os.path.join(TESTS, "nosuchpkg")
+    stream_in = io.StringIO("\n".join([pkg, "", missing, pkg]) + "\n")
+    stream_out = io.StringIO()
+
+    serve(stream_in, stream_out)
+
+    answers = stream_out.getvalue().split("\n\n")
+    assert answers[-1] == ""
+    answers = answers[:-1]
+    assert len(answers) == 3 # the blank query line is skipped
+
+    first, err, again = answers
+    assert re.match(r"<class 'slick\.pkgs\.\w+_testpkg\.TestPkg'>\n'TestPkg'\n\{'foo': \(", first)
+    assert again == first
+    assert err.startswith("error: ")
+    assert "\n" not in err
+    assert "nosuchpkg" in err
+
+    # nothing besides the answers reaches stdout
+    assert capsys.readouterr().out == ""
+
+def test_serve_recipe_output(tmp_path, capsys):
+    pkgdir = tmp_path / "chatty"
+    pkgdir.mkdir()
+    (pkgdir / "package.py").write_text(
+        "from slick.package import *\n"
+        "print('loading chatty')\n"
+        "class Chatty(Package):\n"
+        "    pass\n")
+    stream_out = io.StringIO()
+
+    serve(io.StringIO(str(pkgdir) + "\n"), stream_out)
+
+    assert re.match(r"<class 'slick\.pkgs\.\w+_chatty\.Chatty'>\n", stream_out.getvalue())
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "loading chatty" in captured.err
+
+def expected_output(pkg):
+    # the format `python -m slick.main` has always printed
+    return "\n".join(map(repr, [pkg, pkg.name, pkg.variants, list(pkg.fullnames)]))
+
+def test_slick_output():
+    path = os.path.join(TESTS, "testpkg")
+    pkg = load_package(path)
+    out = slick(path)
+    assert out == expected_output(pkg)
+    assert out.splitlines()[1:] == [
+        "'TestPkg'",
+        "{'foo': (Variant('foo', default=True, description='', values=(True, False),"
+        " multi=False, validator=None, sticky=False),"
+        " [Spec(name='TestPkg', version=set(), variant={}, deps={},"
+        " compiler=Compiler(name='', version=set(), variant={}))])}",
+        "[]",
+    ]
+
+def test_slick_output_repeated(tmp_path):
+    pkgdir = tmp_path / "repeats"
+    pkgdir.mkdir()
+    (pkgdir / "package.py").write_text(
+        "from slick.package import *\n"
+        "class Repeats(Package):\n"
+        "    variant('foo', True)\n"
+        "    variant('bar', False, description='a bar')\n"
+        "    variant('foo', False)\n")
+    pkg = load_package(str(pkgdir))
+    assert len(pkg.variants["foo"][1]) == 2
+    assert slick(str(pkgdir)) == expected_output(pkg)
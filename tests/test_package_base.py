@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import pytest
+
+import slick.package_base
+from slick.package_base import PackageBase
+
+class UnknownPackageError(Exception):
+    pass
+
+def make_repo(graph):
+    """A stand-in for spack.repo with one package class per key of
+    ``graph``, each depending on the listed names (all deptypes).
+    """
+    dep = SimpleNamespace(type=frozenset(["build", "link", "run", "test"]))
+    classes = {
+        name: SimpleNamespace(name=name, dependencies={d: {None: dep} for d in deps})
+        for name, deps in graph.items()
+    }
+
+    def get_pkg_class(name):
+        try:
+            return classes[name]
+        except KeyError:
+            raise UnknownPackageError(name)
+
+    path = SimpleNamespace(
+        is_virtual=lambda name: False,
+        providers_for=lambda name: [],
+        get_pkg_class=get_pkg_class,
+    )
+    repo = SimpleNamespace(path=path, UnknownPackageError=UnknownPackageError)
+    return SimpleNamespace(repo=repo), classes
+
+@pytest.fixture
+def repo(monkeypatch):
+    def install(graph):
+        spack, classes = make_repo(graph)
+        monkeypatch.setattr(slick.package_base, "spack", spack, raising=False)
+        return classes
+    return install
+
+def possible_dependencies(pkg_cls, **kwargs):
+    return PackageBase.possible_dependencies.__func__(pkg_cls, **kwargs)
+
+def test_possible_dependencies(repo):
+    classes = repo({"a": ["b", "c"], "b": ["c", "d"], "c": ["d"], "d": []})
+    assert possible_dependencies(classes["a"]) == {
+        "a": {"b", "c"},
+        "b": {"c", "d"},
+        "c": {"d"},
+        "d": set(),
+    }
+    assert possible_dependencies(classes["a"], transitive=False) == {
+        "a": {"b", "c"},
+        "b": set(),
+        "c": set(),
+    }
+
+def test_possible_dependencies_missing(repo):
+    # x is in no repository. It is first reached through b (depth-first),
+    # so it is reported as b's missing dependency, not a's.
+    classes = repo({"a": ["b", "x"], "b": ["x", "c"], "c": []})
+    missing = {}
+    visited = possible_dependencies(classes["a"], missing=missing)
+    assert missing == {"b": {"x"}}
+    assert visited == {
+        "a": {"b", "x"},
+        "b": {"x", "c"},
+        "x": set(),
+        "c": set(),
+    }
+
+def test_possible_dependencies_deep(repo):
+    # deeper than the recursion limit
+    n = 5000
+    graph = {"p%d" % i: ["p%d" % (i + 1)] for i in range(n)}
+    graph["p%d" % n] = []
+    classes = repo(graph)
+    visited = possible_dependencies(classes["p0"])
+    assert len(visited) == n + 1
@@ -0,0 +1,136 @@
+import inspect
+import os
+import sys
+
+import pytest
+import yaml
+
+from slick.repo import load_package
+
+RECIPE = """from slick.package import *
+
+class {cls}(Package):
+    variant('foo', {default})
+"""
+
+def write_recipe(pkgdir, default):
+    pkgdir.mkdir(exist_ok=True)
+    path = pkgdir / "package.py"
+    path.write_text(RECIPE.format(cls=pkgdir.name.capitalize(), default=default))
+    return path
+
+def test_load_package_cache_hit(tmp_path, monkeypatch):
+    write_recipe(tmp_path / "cachehit", True)
+    monkeypatch.chdir(tmp_path)
+
+    cls = load_package("cachehit")
+    assert cls.__name__ == "Cachehit"
+    # equivalent spellings of the same directory share one entry
+    assert load_package("cachehit") is cls
+    assert load_package("./cachehit") is cls
+    assert load_package("cachehit/") is cls
+    assert load_package(str(tmp_path / "cachehit")) is cls
+
+def test_load_package_cache_miss(tmp_path, monkeypatch):
+    # Same relative name, different recipes: the cwd decides.
+    for sub, default in (("a", True), ("b", False)):
+        (tmp_path / sub).mkdir()
+        path = write_recipe(tmp_path / sub / "cachemiss", default)
+        # give both files the same mtime, to rule out a lucky invalidation
+        os.utime(path, ns=(0, 10**18))
+
+    monkeypatch.chdir(tmp_path / "a")
+    a = load_package("cachemiss")
+    monkeypatch.chdir(tmp_path / "b")
+    b = load_package("cachemiss")
+    assert a is not b
+    assert a.variants["foo"][0].default is True
+    assert b.variants["foo"][0].default is False
+
+def test_load_package_mtime_invalidation(tmp_path):
+    pkgdir = tmp_path / "cacheedit"
+    path = write_recipe(pkgdir, True)
+    st = os.stat(path)
+
+    old = load_package(str(pkgdir))
+    assert load_package(str(pkgdir)) is old
+
+    write_recipe(pkgdir, False)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 5 * 10**9))
+    new = load_package(str(pkgdir))
+    assert new is not old
+    assert new.variants["foo"][0].default is False
+
+def test_load_package_missing(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_package(str(tmp_path / "nosuchpkg"))
+
+def test_load_package_keeps_real_modules(tmp_path):
+    # A recipe named after an installed module must not replace it.
+    write_recipe(tmp_path / "yaml", True)
+    cls = load_package(str(tmp_path / "yaml"))
+    assert cls.__module__.startswith("slick.pkgs.")
+
+    assert sys.modules["yaml"] is yaml
+    assert sys.modules[cls.__module__].Yaml is cls
+
+def test_load_package_failed_reload(tmp_path):
+    pkgdir = tmp_path / "badedit"
+    path = write_recipe(pkgdir, True)
+    st = os.stat(path)
+    cls = load_package(str(pkgdir))
+    good = sys.modules[cls.__module__]
+
+    path.write_text("raise RuntimeError('broken recipe')\n")
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 5 * 10**9))
+    with pytest.raises(RuntimeError):
+        load_package(str(pkgdir))
+    assert sys.modules[cls.__module__] is good
+    assert good.Badedit is cls
+
+def test_load_package_same_name_two_repos(tmp_path):
+    # Recipes with the same name in different repos get separate modules.
+    a_dir = tmp_path / "a"
+    b_dir = tmp_path / "b"
+    a_dir.mkdir()
+    b_dir.mkdir()
+    write_recipe(a_dir / "zlib", True)
+    write_recipe(b_dir / "zlib", False)
+
+    a = load_package(str(a_dir / "zlib"))
+    b = load_package(str(b_dir / "zlib"))
+    assert a is not b
+    assert a.__module__ != b.__module__
+    assert sys.modules[a.__module__].Zlib is a
+    assert sys.modules[b.__module__].Zlib is b
+    assert inspect.getsourcefile(a) == str(a_dir / "zlib" / "package.py")
+    assert inspect.getsourcefile(b) == str(b_dir / "zlib" / "package.py")
+
+def test_load_package_class_lookup(tmp_path):
+    pkgdir = tmp_path / "twocase"
+    pkgdir.mkdir()
+    path = pkgdir / "package.py"
+
+    # the class name only has to match case-insensitively
+    path.write_text("from slick.package import *\n"
+                    "class TwoCase(Package):\n"
+                    "    pass\n"
+                    "twocase_helper = 'not a class'\n")
+    assert load_package(str(pkgdir)).__name__ == "TwoCase"
+
+    st = os.stat(path)
+    path.write_text("from slick.package import *\n"
+                    "class Twocase(Package):\n"
+                    "    pass\n"
+                    "class TwoCase(Package):\n"
+                    "    pass\n")
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 5 * 10**9))
+    with pytest.raises(ImportError, match="Multiple classes"):
+        load_package(str(pkgdir))
+
+    path.write_text("from slick.package import *\n"
+                    "class Other(Package):\n"
+                    "    pass\n")
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 * 10**9))
+    with pytest.raises(ImportError, match="No class"):
+        load_package(str(pkgdir))
@@ -0,0 +1,136 @@
+import pytest
+
+import slick.spec
+from slick.spec import SpecSyntaxError, VariantType, VariantValue, parse_spec
+
+def boolvar(enable, propagate=False):
+    return VariantValue(type=VariantType.bool, enable=enable, propagate=propagate)
+
+def singlevar(value, propagate=False):
+    return VariantValue(type=VariantType.single, value=value, propagate=propagate)
+
+def test_bare_name():
+    s = parse_spec("hdf5")
+    assert s.name == "hdf5"
+    assert s.variant == {}
+    assert parse_spec("github.com/intel/llvm").name == "github.com/intel/llvm"
+
+@pytest.mark.parametrize("flag, enable, propagate", [
+    ("+",  True,  False),
+    ("-",  False, False),
+    ("~",  False, False),
+    ("++", True,  True),
+    ("--", False, True),
+    ("~~", False, True),
+])
+def test_bool_flags(flag, enable, propagate):
+    assert parse_spec("llvm " + flag + "debug").variant == {"debug": boolvar(enable, propagate)}
+    # whitespace before the flag is optional, except that "-" is
+    # part of a name: "llvm-debug" is a package, not a variant
+    if flag[0] != "-":
+        assert parse_spec("llvm" + flag + "debug").variant == {"debug": boolvar(enable, propagate)}
+    else:
+        assert parse_spec("llvm" + flag + "debug").name == "llvm" + flag + "debug"
+
+def test_key_value():
+    s = parse_spec("llvm build_type=Release libs == shared")
+    assert s.variant == {
+        "build_type": singlevar("Release"),
+        "libs":       singlevar("shared", propagate=True),
+    }
+
+def test_repeated_variants():
+    s = parse_spec("llvm +debug foo=bar ++debug foo==bar")
+    assert s.variant == {
+        "debug": boolvar(True, propagate=True),
+        "foo":   singlevar("bar", propagate=True),
+    }
+    with pytest.raises(KeyError):
+        parse_spec("llvm foo=bar foo=baz")
+    with pytest.raises(KeyError):
+        parse_spec("llvm +debug ~debug")
+
+def test_arch():
+    s = parse_spec("llvm arch=cray-CNL10-haswell-sm_70")
+    assert s.variant == {
+        "platform": singlevar("cray"),
+        "os":       singlevar("CNL10"),
+        "target":   singlevar("haswell"),
+        "gpu_arch": singlevar("sm_70"),
+    }
+    s = parse_spec("llvm arch==linux-nil-zen2")
+    assert s.variant == {
+        "platform": singlevar("linux", propagate=True),
+        "target":   singlevar("zen2", propagate=True),
+    }
+    assert parse_spec("llvm arch=linux").variant == {"platform": singlevar("linux")}
+    # arch fields unify with the separate keywords
+    s = parse_spec("llvm os=CNL10 arch=cray-CNL10")
+    assert s.variant["os"] == singlevar("CNL10")
+    with pytest.raises(KeyError):
+        parse_spec("llvm os=CNL10 arch=cray-SuSE")
+
+def test_reserved_names():
+    with pytest.raises(KeyError, match="must be a string"):
+        parse_spec("llvm +os")
+    with pytest.raises(KeyError, match="must be a string"):
+        parse_spec("llvm ~~cflags")
+
+def test_reserved_bool_names(monkeypatch):
+    monkeypatch.setattr(slick.spec, "variant_bools", frozenset(["shared"]))
+    with pytest.raises(KeyError, match="must be a bool"):
+        parse_spec("llvm shared=yes")
+    assert parse_spec("llvm +shared").variant == {"shared": boolvar(True)}
+
+@pytest.mark.parametrize("info", [
+    "llvm@1.2",
+    "llvm @1.2:1.4",
+    "llvm @1.2 : 1.4",
+    "llvm @1.2:",
+    "llvm @: 3",
+])
+def test_version(info):
+    # accepted, but version ranges are not recorded yet
+    s = parse_spec(info)
+    assert s.name == "llvm"
+    assert s.version == set()
+
+@pytest.mark.parametrize("info", [
+    "llvm %gcc",
+    "llvm % gcc @4.7.3",
+    "llvm@1.2.3 %gcc@4.7.3 +debug",
+    "llvm %gcc %gcc@4.7",
+])
+def test_compiler(info):
+    s = parse_spec(info)
+    assert s.name == "llvm"
+    assert s.compiler.name == "gcc"
+    assert parse_spec("llvm").compiler.name == ""
+    with pytest.raises(KeyError, match="Incompatible compilers"):
+        parse_spec(info + " %clang")
+
+def test_compiler_then_key_value():
+    s = parse_spec("llvm %gcc foo=bar")
+    assert s.compiler.name == "gcc"
+    assert s.variant == {"foo": singlevar("bar")}
+
+@pytest.mark.parametrize("info", [
+    "",
+    "+debug",
+    "foo=bar",
+    "llvm foo",
+    "llvm+foo=bar",
+    "llvm @1.2.3.4",
+    "llvm @",
+    "llvm ^zlib",
+    "llvm foo===bar",
+])
+def test_syntax_errors(info):
+    with pytest.raises(SpecSyntaxError):
+        parse_spec(info)
+
+def test_result_is_a_copy():
+    s = parse_spec("llvm +debug")
+    s.variant.clear()
+    s.name = "changed"
+    assert parse_spec("llvm +debug").variant == {"debug": boolvar(True)}